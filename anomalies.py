@@ -0,0 +1,314 @@
+"""Batched anomaly detection over every metric timeseries in a health tree.
+
+All series are scored in one vectorised pass (grouped by length, so the
+common fixed-length case is a single dense matrix) with three detectors:
+
+• robust z-score of each point against the rolling median / MAD of the
+  points before it,
+• EWMA residuals – the gap between a point and the exponentially weighted
+  average of everything before it (outliers clipped so they can't drag the
+  average), scaled by the series' typical residual or step,
+• spikes – a point that jumps away from *both* neighbours in the same
+  direction, scaled by the series' typical step. No seasonal model needed.
+
+A point is flagged when any detector fires. Flags are split into *adverse*
+(moving the wrong way for the metric's ``higher_is_better``) and favourable,
+and adverse counts roll up the tree so the dashboard can badge parents.
+
+Kept free of Streamlit so it can be reused outside the dashboard; callers
+cache ``detect_tree`` per data version.
+"""
+
+from collections.abc import Mapping
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from health_tree import is_numeric
+
+ROLLING_WINDOW = 5      # prior points used for the rolling median / MAD
+MIN_HISTORY = 3         # points needed before a point can be scored
+EWMA_ALPHA = 0.3
+Z_THRESHOLD = 3.5       # robust z (Iglewicz & Hoaglin)
+EWMA_THRESHOLD = 3.0
+SPIKE_THRESHOLD = 3.0
+
+_MAD_SCALE = 1.4826     # MAD → σ for normally distributed data
+_EPS = 1e-9
+
+
+def _median(a, axis=-1):
+    """``np.median`` via a single partition – noticeably faster on the short
+    rows we score, and identical in result."""
+    a = np.moveaxis(np.asarray(a), axis, -1)
+    n = a.shape[-1]
+    half = n // 2
+    if n % 2:
+        return np.partition(a, half, axis=-1)[..., half]
+    part = np.partition(a, (half - 1, half), axis=-1)
+    return 0.5 * (part[..., half - 1] + part[..., half])
+
+
+def _scale_floor(x, scale):
+    """Keep a scale away from zero so flat series don't explode to ∞."""
+    floor = 0.01 * np.abs(x).mean(axis=1) + _EPS
+    return np.maximum(scale, floor)
+
+
+def _step_scale(x):
+    """Robust σ of sprint-to-sprint steps – the series' ordinary movement."""
+    step = np.abs(np.diff(x, axis=1))
+    return _scale_floor(x, _MAD_SCALE * _median(step, axis=1))
+
+
+def _rolling_z(x, step_scale):
+    n_points = x.shape[1]
+    z = np.zeros_like(x)
+    med = np.empty_like(x)
+    mad = np.empty_like(x)
+    # short windows at the start of the series, then one strided pass
+    for t in range(MIN_HISTORY, min(ROLLING_WINDOW, n_points)):
+        past = x[:, :t]
+        med[:, t] = _median(past, axis=1)
+        mad[:, t] = _median(np.abs(past - med[:, t, None]), axis=1)
+    if n_points > ROLLING_WINDOW:
+        past = sliding_window_view(x[:, :-1], ROLLING_WINDOW, axis=1)
+        m = _median(past, axis=2)
+        med[:, ROLLING_WINDOW:] = m
+        mad[:, ROLLING_WINDOW:] = _median(np.abs(past - m[..., None]), axis=2)
+    # a steady trend moves the point away from its past median; don't let
+    # the window's spread fall below the series' ordinary step size
+    scale = np.maximum(_MAD_SCALE * mad[:, MIN_HISTORY:], step_scale[:, None])
+    z[:, MIN_HISTORY:] = (x[:, MIN_HISTORY:] - med[:, MIN_HISTORY:]) / scale
+    return z
+
+
+def _ewma_residuals(x, clip=None):
+    """One-step-ahead residuals against an EWMA level.
+
+    With ``clip=(lo, hi)`` the residual that updates the level is clipped
+    first, so an outlier can't drag the level and flag the points after it.
+    """
+    n_points = x.shape[1]
+    resid = np.zeros_like(x)
+    level = x[:, 0].copy()
+    for t in range(1, n_points):
+        resid[:, t] = x[:, t] - level
+        step = resid[:, t] if clip is None else np.clip(resid[:, t], *clip)
+        level += EWMA_ALPHA * step
+    return resid
+
+
+def _residual_centre_scale(x, resid, step_scale):
+    # under a steady trend the residual settles at a constant offset, so
+    # score deviations from the typical residual rather than from zero
+    tail = resid[:, 1:]
+    centre = _median(tail, axis=1)
+    scale = _MAD_SCALE * _median(np.abs(tail - centre[:, None]), axis=1)
+    # as in _rolling_z, ordinary step-sized movement is never an anomaly
+    return centre, np.maximum(_scale_floor(x, scale), step_scale)
+
+
+def _ewma_residual_z(x, step_scale):
+    # first pass finds the residual band, second keeps outliers out of the level
+    centre, scale = _residual_centre_scale(x, _ewma_residuals(x), step_scale)
+    bound = EWMA_THRESHOLD * scale
+    resid = _ewma_residuals(x, clip=(centre - bound, centre + bound))
+    centre, scale = _residual_centre_scale(x, resid, step_scale)
+    z = (resid - centre[:, None]) / scale[:, None]
+    z[:, :MIN_HISTORY] = 0.0
+    return z
+
+
+def _spike_z(x, step_scale):
+    z = np.zeros_like(x)
+    if x.shape[1] < 3:
+        return z
+    left = x[:, 1:-1] - x[:, :-2]
+    right = x[:, 1:-1] - x[:, 2:]
+    same_side = np.sign(left) == np.sign(right)
+    height = np.where(same_side, np.sign(left) * np.minimum(np.abs(left), np.abs(right)), 0.0)
+    z[:, 1:-1] = height / step_scale[:, None]
+    return z
+
+
+def score_matrix(x, higher_is_better):
+    """Score a dense ``(n_series, n_points)`` matrix.
+
+    Returns ``(flags, adverse)`` boolean matrices of the same shape. A flag
+    is adverse when the deviation points the wrong way for the metric.
+    """
+    x = np.asarray(x, dtype=float)
+    hib = np.asarray(higher_is_better, dtype=bool)[:, None]
+    step_scale = _step_scale(x)
+    scores = (
+        (_rolling_z(x, step_scale), Z_THRESHOLD),
+        (_ewma_residual_z(x, step_scale), EWMA_THRESHOLD),
+        (_spike_z(x, step_scale), SPIKE_THRESHOLD),
+    )
+    flags = np.zeros(x.shape, dtype=bool)
+    direction = np.zeros(x.shape)
+    for z, threshold in scores:
+        hit = np.abs(z) > threshold
+        flags |= hit
+        # strongest detector decides the direction of a flagged point
+        stronger = hit & (np.abs(z) > np.abs(direction))
+        direction = np.where(stronger, z, direction)
+    adverse = flags & np.where(hib, direction < 0, direction > 0)
+    return flags, adverse
+
+
+class Detections:
+    """Results of one ``detect`` call.
+
+    Counts are arrays indexed like the input series; the per-series dict
+    (``points`` / ``adverse_points`` / ``count`` / ``adverse``) is only
+    built when a series is looked up.
+    """
+
+    def __init__(self, n):
+        self.valid = np.zeros(n, dtype=bool)
+        self.count = np.zeros(n, dtype=np.int64)
+        self.adverse = np.zeros(n, dtype=np.int64)
+        self._group = np.full(n, -1)
+        self._row = np.zeros(n, dtype=np.int64)
+        self._flags = []
+
+    def __len__(self):
+        return len(self.valid)
+
+    def __getitem__(self, i):
+        g = self._group[i]
+        if g < 0:
+            return {"points": [], "adverse_points": [], "count": 0, "adverse": 0}
+        flags, adverse = self._flags[g]
+        row = self._row[i]
+        return {
+            "points": np.flatnonzero(flags[row]).tolist(),
+            "adverse_points": np.flatnonzero(adverse[row]).tolist(),
+            "count": int(self.count[i]),
+            "adverse": int(self.adverse[i]),
+        }
+
+
+def _numeric_rows(rows):
+    """``(matrix, ok)`` for equal-length rows, agreeing with ``is_numeric``:
+    one conversion for the whole group, falling back to a per-row check
+    only when it holds non-numbers."""
+    try:
+        x = np.asarray(rows)
+    except (ValueError, OverflowError):  # nested lists, oversized ints
+        x = None
+    if x is not None and x.ndim == 2 and x.dtype.kind in "biuf":
+        x = x.astype(float)
+        ok = np.isfinite(x).all(axis=1)
+        return (x if ok.all() else x[ok]), ok
+    ok = np.array([is_numeric(r) for r in rows], dtype=bool)
+    x = np.array([r for r, good in zip(rows, ok) if good], dtype=float)
+    return x.reshape(int(ok.sum()), -1), ok
+
+
+def detect(series, higher_is_better):
+    """Score a list of series in one batched pass.
+
+    Series may differ in length; they are grouped by length and each group
+    is scored as one matrix. Series that fail ``is_numeric`` are left out
+    (``valid`` is False). Returns a ``Detections``.
+    """
+    result = Detections(len(series))
+    if not len(series):
+        return result
+    lengths = np.fromiter(map(len, series), dtype=np.int64, count=len(series))
+    hib_all = np.asarray(higher_is_better, dtype=bool)
+    for length in np.unique(lengths):
+        if not length:
+            continue
+        idx = np.flatnonzero(lengths == length)
+        x, ok = _numeric_rows([series[i] for i in idx])
+        idx = idx[ok]
+        result.valid[idx] = True
+        if length <= MIN_HISTORY or not len(idx):
+            continue
+        flags, adverse = score_matrix(x, hib_all[idx])
+        result.count[idx] = flags.sum(axis=1)
+        result.adverse[idx] = adverse.sum(axis=1)
+        result._group[idx] = len(result._flags)
+        result._row[idx] = np.arange(len(idx))
+        result._flags.append((flags, adverse))
+    return result
+
+
+class _MetricResults(Mapping):
+    """``(node_path, metric_name) → result`` view over a ``Detections``."""
+
+    def __init__(self, keys, detections):
+        self._index = {key: i for i, key in enumerate(keys) if detections.valid[i]}
+        self._detections = detections
+
+    def __getitem__(self, key):
+        return self._detections[self._index[key]]
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+
+def detect_tree(tree):
+    """Detect anomalies for every metric in ``tree`` and roll counts up.
+
+    Returns ``{"metrics": {(node_path, metric_name): result},
+    "nodes": {node_path: {"own", "total", "own_adverse", "total_adverse"}}}``.
+    ``total*`` counts include every descendant node. ``metrics`` is a
+    read-only mapping that builds each result on lookup.
+    """
+    paths, parents = [], []
+    keys, series, hib, owner = [], [], [], []
+
+    def walk(nodes, parent_path, parent):
+        for node in nodes:
+            node_path = f"{parent_path}/{node['indicator']}".strip("/")
+            here = len(paths)
+            paths.append(node_path)
+            parents.append(parent)
+            for metric in node.get("metrics", []):
+                values = metric.get("timeseries")
+                keys.append((node_path, metric.get("metric_name", "Metric")))
+                series.append(values if isinstance(values, (list, tuple)) else [])
+                hib.append(metric.get("higher_is_better", True))
+                owner.append(here)
+            walk(node.get("children", []), node_path, here)
+
+    walk(tree, "", -1)
+    detections = detect(series, hib)
+
+    n_nodes = len(paths)
+    own = np.bincount(owner, weights=detections.count, minlength=n_nodes).astype(int)
+    own_adverse = np.bincount(owner, weights=detections.adverse, minlength=n_nodes).astype(int)
+    total, total_adverse = own.copy(), own_adverse.copy()
+    # nodes are in pre-order, so walking backwards sees children first
+    for i in range(n_nodes - 1, -1, -1):
+        if parents[i] >= 0:
+            total[parents[i]] += total[i]
+            total_adverse[parents[i]] += total_adverse[i]
+
+    nodes = {
+        path: {
+            "own": int(own[i]),
+            "total": int(total[i]),
+            "own_adverse": int(own_adverse[i]),
+            "total_adverse": int(total_adverse[i]),
+        }
+        for i, path in enumerate(paths)
+    }
+    return {"metrics": _MetricResults(keys, detections), "nodes": nodes}
+
+
+def needs_attention(result, limit=None):
+    """Node paths with adverse anomalies, worst first."""
+    ranked = sorted(
+        ((path, c) for path, c in result["nodes"].items() if c["own_adverse"]),
+        key=lambda item: (-item[1]["own_adverse"], -item[1]["own"], item[0]),
+    )
+    return ranked[:limit] if limit else ranked
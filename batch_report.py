@@ -0,0 +1,149 @@
+"""Headless batch version of the "What Happened" narrative.
+
+Reads every team tree (``*.json``, same shape as
+``delivery_health_tree_scenario.json``) in a directory, summarises each team
+across a process pool and streams one JSON line per team as soon as it is
+done. Only the trees currently being worked on are held in memory.
+
+    python batch_report.py teams/ -o report.jsonl --workers 8
+"""
+
+import argparse
+import json
+import os
+import sys
+from multiprocessing import Pool
+from pathlib import Path
+
+import anomalies
+from health_tree import is_numeric, iter_series
+
+# same keyword picks as the sidebar in pages/01_what_happened.py
+KEY_METRICS = {
+    "wip": "work in progress",
+    "cycle_time": "cycle time",
+    "carry_over": "carry-over",
+    "interrupt": "interrupt",
+    "estimation": "estimation",
+}
+TOP_MOVERS = 5
+
+
+def trend_of(values):
+    return "up" if values[-1] > values[0] else "down" if values[-1] < values[0] else "neutral"
+
+
+def is_breached(metric, value):
+    """True when ``value`` is at or past ``breach_threshold``.
+
+    The threshold sits on the far side of ``target``; without a target fall
+    back to ``higher_is_better``. Metrics whose threshold or target isn't a
+    number are skipped rather than failing the whole team.
+    """
+    threshold = metric.get("breach_threshold")
+    target = metric.get("target")
+    if not is_numeric([threshold]) or (target is not None and not is_numeric([target])):
+        return False
+    worse_is_higher = threshold > target if target is not None else not metric.get("higher_is_better", True)
+    return value >= threshold if worse_is_higher else value <= threshold
+
+
+def describe(path, metric):
+    values = metric["timeseries"]
+    delta = values[-1] - values[0]
+    trend = trend_of(values)
+    higher_is_better = metric.get("higher_is_better", True)
+    return {
+        "metric": metric.get("metric_name", "Metric"),
+        "indicator": path,
+        "start": values[0],
+        "end": values[-1],
+        "delta": round(delta, 4),
+        "pct_change": round(100 * delta / abs(values[0]), 2) if values[0] else None,
+        "trend": trend,
+        "improving": trend != "neutral" and (trend == "up") == higher_is_better,
+    }
+
+
+def summarise_tree(tree, team, top=TOP_MOVERS):
+    numeric = [
+        (path, m) for path, m in iter_series(tree)
+        if is_numeric(m.get("timeseries"))
+    ]
+    described = [describe(path, m) for path, m in numeric]
+
+    # unlike the page's selectbox there is no fallback: no match → None
+    key_metrics = {
+        role: next((d for d in described if kw in d["metric"].lower()), None)
+        for role, kw in KEY_METRICS.items()
+    }
+
+    breaches = [
+        dict(d, breach_threshold=m["breach_threshold"], target=m.get("target"))
+        for d, (path, m) in zip(described, numeric)
+        if is_breached(m, m["timeseries"][-1])
+    ]
+
+    # relative change where there is a baseline, otherwise absolute
+    movers = sorted(
+        described,
+        key=lambda d: abs(d["pct_change"]) if d["pct_change"] is not None else abs(d["delta"]),
+        reverse=True,
+    )
+
+    # node totals come straight from the count arrays; no per-series dicts
+    flagged = anomalies.detect_tree(tree)["nodes"]
+    return {
+        "team": team,
+        "metrics": len(described),
+        "key_metrics": key_metrics,
+        "breaches": breaches,
+        "top_movers": movers[:top],
+        "anomalies": sum(c["own_adverse"] for c in flagged.values()),
+    }
+
+
+def summarise_file(args):
+    path, top = args
+    try:
+        with open(path) as f:
+            tree = json.load(f)
+        return summarise_tree(tree, Path(path).stem, top)
+    except Exception as exc:
+        # any bad tree becomes an error record; never take the pool down
+        return {"team": Path(path).stem, "error": f"{type(exc).__name__}: {exc}"}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("directory", type=Path, help="directory of team tree JSON files")
+    parser.add_argument("-o", "--output", type=Path, help="JSONL file to write (default: stdout)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument(
+        "--chunksize", type=int, default=1,
+        help="files handed to a worker at a time; above 1 a finished team waits for the rest of its chunk",
+    )
+    parser.add_argument("--top", type=int, default=TOP_MOVERS, help="top movers to report per team")
+    args = parser.parse_args(argv)
+
+    if not args.directory.is_dir():
+        parser.error(f"{args.directory} is not a directory")
+
+    # only paths are queued; each worker loads and drops its own tree
+    jobs = ((str(p), args.top) for p in args.directory.glob("*.json"))
+    out = open(args.output, "w") if args.output else sys.stdout
+    failed = 0
+    try:
+        with Pool(args.workers) as pool:
+            for record in pool.imap_unordered(summarise_file, jobs, chunksize=args.chunksize):
+                failed += "error" in record
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,33 @@
+"""Small helpers for walking a delivery-health tree.
+
+Shared by the anomaly pass, the sprint histories, the batch report and the
+dashboard so they agree on node paths and on which series count as data.
+"""
+
+import math
+
+
+def iter_series(nodes, parent_path=""):
+    """Yield ``(node_path, metric)`` for every metric, depth first.
+
+    Paths are built the same way as the sidebar options in ``main.py``.
+    """
+    for node in nodes:
+        node_path = f"{parent_path}/{node['indicator']}".strip("/")
+        for metric in node.get("metrics", []):
+            yield node_path, metric
+        yield from iter_series(node.get("children", []), node_path)
+
+
+def _is_finite_number(v):
+    if not isinstance(v, (int, float)):
+        return False
+    try:
+        return math.isfinite(v)
+    except OverflowError:  # an int too large for a float
+        return False
+
+
+def is_numeric(values):
+    """True for a non-empty series of finite numbers."""
+    return bool(values) and all(_is_finite_number(v) for v in values)
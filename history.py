@@ -0,0 +1,145 @@
+"""Chunked, delta-encoded storage for long metric histories.
+
+A history is split into fixed sprint-range chunks, each its own small array.
+Values are quantised to the metric's decimal precision and a chunk stores
+its first value (the base) plus integer steps from sprint to sprint, packed
+into the smallest integer dtype that fits that chunk (usually int8 or int16).
+Each chunk decodes on its own, so a window read touches only the chunks that
+overlap it.
+
+``detach_histories`` makes the encoded form the only in-memory copy: it
+removes the raw ``timeseries`` lists from the tree, so the dashboard keeps
+roughly 1–2 bytes per sprint instead of a Python float list per metric.
+"""
+
+import numpy as np
+
+from health_tree import is_numeric, iter_series
+
+CHUNK_SIZE = 16         # sprints per chunk
+MAX_DECIMALS = 6        # values finer than this are rounded on encode
+_MAX_QUANTISED = 2 ** 62  # keeps every step between two values inside int64
+
+_INT_DTYPES = (np.int8, np.int16, np.int32, np.int64)
+
+
+def _decimals(values):
+    """Smallest number of decimals that reproduces every value exactly."""
+    for d in range(MAX_DECIMALS + 1):
+        scaled = values * 10 ** d
+        if np.allclose(scaled, np.round(scaled), rtol=0, atol=1e-6):
+            return d
+    return MAX_DECIMALS
+
+
+def _smallest_int(steps):
+    lo, hi = (int(steps.min()), int(steps.max())) if steps.size else (0, 0)
+    for dtype in _INT_DTYPES:
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return dtype
+    return np.int64
+
+
+class MetricHistory:
+    """One metric's history, readable by sprint window.
+
+    Sprints are 0-based indices into the original series; windows are
+    half-open ``[start, stop)`` like a slice. Values must be finite. Series
+    too large to quantise into int64 are kept as raw float chunks
+    (``decimals`` is None).
+    """
+
+    __slots__ = ("length", "chunk_size", "decimals", "_chunks")
+
+    def __init__(self, values, chunk_size=CHUNK_SIZE):
+        values = np.asarray(values, dtype=float)
+        if not np.isfinite(values).all():
+            raise ValueError("history values must be finite")
+        self.length = len(values)
+        self.chunk_size = chunk_size
+        self.decimals = _decimals(values)
+        if values.size and np.abs(values).max() * 10 ** self.decimals >= _MAX_QUANTISED:
+            self.decimals = None
+            self._chunks = [
+                (0, values[i:i + chunk_size].copy()) for i in range(0, self.length, chunk_size)
+            ]
+            return
+        q = np.round(values * 10 ** self.decimals).astype(np.int64)
+        self._chunks = []
+        for i in range(0, self.length, chunk_size):
+            part = q[i:i + chunk_size]
+            steps = np.diff(part)
+            self._chunks.append((int(part[0]), steps.astype(_smallest_int(steps))))
+
+    def __len__(self):
+        return self.length
+
+    @property
+    def nbytes(self):
+        return sum(8 + steps.nbytes for _, steps in self._chunks)
+
+    def clip(self, start=0, stop=None):
+        """Clamp a window to the stored range."""
+        stop = self.length if stop is None else min(stop, self.length)
+        return max(0, min(start, stop)), stop
+
+    def _decode(self, chunk):
+        base, steps = self._chunks[chunk]
+        if self.decimals is None:
+            return steps
+        q = np.empty(len(steps) + 1, dtype=np.int64)
+        q[0] = base
+        np.cumsum(steps, dtype=np.int64, out=q[1:])
+        q[1:] += base
+        return q / 10 ** self.decimals
+
+    def window(self, start=0, stop=None):
+        """Decode sprints ``[start, stop)`` as a float array."""
+        start, stop = self.clip(start, stop)
+        if start == stop:
+            return np.empty(0)
+        first_chunk = start // self.chunk_size
+        last_chunk = (stop - 1) // self.chunk_size
+        decoded = np.concatenate([self._decode(c) for c in range(first_chunk, last_chunk + 1)])
+        lo = first_chunk * self.chunk_size
+        return decoded[start - lo:stop - lo].copy()
+
+    def tail(self, n):
+        """The last ``n`` sprints."""
+        return self.window(self.length - n)
+
+
+def window_delta(values):
+    """Change across a window: last value minus first."""
+    return float(values[-1] - values[0]) if len(values) else 0.0
+
+
+def build_histories(tree, chunk_size=CHUNK_SIZE):
+    """Encode every numeric metric series in ``tree``.
+
+    Returns ``{(node_path, metric_name): MetricHistory}`` keyed like the
+    anomaly results.
+    """
+    histories = {}
+    for node_path, metric in iter_series(tree):
+        values = metric.get("timeseries", [])
+        if not is_numeric(values):
+            continue
+        key = (node_path, metric.get("metric_name", "Metric"))
+        histories[key] = MetricHistory(values, chunk_size)
+    return histories
+
+
+def detach_histories(tree, chunk_size=CHUNK_SIZE):
+    """Like ``build_histories``, but also drop each encoded ``timeseries``
+    from ``tree`` so the histories are the only copy kept in memory.
+
+    Anything that needs the raw series (e.g. ``anomalies.detect_tree``)
+    must run first.
+    """
+    histories = build_histories(tree, chunk_size)
+    for node_path, metric in iter_series(tree):
+        if (node_path, metric.get("metric_name", "Metric")) in histories:
+            metric.pop("timeseries", None)
+    return histories
@@ -1,7 +1,14 @@
 import streamlit as st
 import json
+import hashlib
 import plotly.graph_objs as go
 
+import anomalies
+import history
+from health_tree import is_numeric
+
+DEFAULT_WINDOW = 12  # sprints shown until the user widens the range
+
 # ----- CONFIG: Force light mode -----
 st.set_page_config(page_title="Delivery Health Model Dashboard", layout="wide")
 st.markdown("""
@@ -16,21 +23,36 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # ----- Load Data -----
-with open("delivery_health_tree_scenario.json") as f:
-    tree_data = json.load(f)
-
-def build_radio_options(nodes, parent_path='', level=0):
+with open("delivery_health_tree_scenario.json", "rb") as f:
+    raw_data = f.read()
+data_version = hashlib.sha1(raw_data).hexdigest()
+
+@st.cache_resource
+def load_data(version, _raw):
+    # keyed on the data version only; the raw bytes are not hashed
+    tree = json.loads(_raw)
+    # anomalies need the raw series, so score them before detaching:
+    # afterwards the encoded histories are the only copy kept in memory
+    found = anomalies.detect_tree(tree)
+    return tree, found, history.detach_histories(tree)
+
+tree_data, anomaly_result, metric_histories = load_data(data_version, raw_data)
+del raw_data
+
+def build_radio_options(nodes, parent_path='', level=0, node_counts=None):
     result = []
     for node in nodes:
         node_path = f"{parent_path}/{node['indicator']}".strip("/")
         prefix = "&nbsp;" * (4 * level)
         icon = "▶ " if node.get("children") else "• "
-        result.append((node_path, f"{prefix}{icon}{node['indicator']}"))
+        flagged = (node_counts or {}).get(node_path, {}).get("total_adverse", 0)
+        badge = f" 🔴 {flagged}" if flagged else ""
+        result.append((node_path, f"{prefix}{icon}{node['indicator']}{badge}"))
         if node.get("children"):
-            result += build_radio_options(node["children"], node_path, level+1)
+            result += build_radio_options(node["children"], node_path, level+1, node_counts)
     return result
 
-all_options = build_radio_options(tree_data)
+all_options = build_radio_options(tree_data, node_counts=anomaly_result["nodes"])
 
 def find_node_by_path(nodes, path):
     if not path:
@@ -43,9 +65,15 @@ def find_node_by_path(nodes, path):
             return find_node_by_path(node.get('children', []), '/'.join(parts[1:]))
     return nodes[0]
 
-def metric_card(metric, target=None, higher_is_better=True):
-    values = metric.get("timeseries", [])
-    if not values or not all(isinstance(x, (int, float)) for x in values):
+def metric_card(metric, target=None, higher_is_better=True, anomaly=None, series=None, window=None):
+    if series is not None:
+        start, stop = series.clip(*(window or (0, None)))
+        values = series.window(start, stop).tolist()
+        at_latest = stop == len(series)
+    else:
+        values = metric.get("timeseries", [])
+        start, at_latest = 0, True
+    if not is_numeric(values):
         st.warning("No data for this metric.")
         return
     metric_name = metric.get("metric_name", "Metric")
@@ -53,17 +81,19 @@ def metric_card(metric, target=None, higher_is_better=True):
     unit = metric.get("unit", "")
     y_axis_label = metric.get("y_axis_label", unit or "")
     x_axis_label = "Sprint"
+    sprints = list(range(start + 1, start + 1 + len(values)))
+    value = metric.get("value", 0) if at_latest else values[-1]
 
     trend = "up" if values[-1] > values[0] else "down" if values[-1] < values[0] else "neutral"
     delta = values[-1] - values[0]
     val_format = "{:.0f}" if unit in ["count", "days", "sprints"] else "{:.1f}"
-    value_display = val_format.format(metric.get("value", 0))
+    value_display = val_format.format(value)
     delta_str = f"{'+' if delta>=0 else ''}{val_format.format(delta)}"
     if unit == "%":
-        value_display = f"{metric.get('value', 0):.1f}%"
+        value_display = f"{value:.1f}%"
         delta_str = f"{'+' if delta>=0 else ''}{delta:.1f}%"
     elif unit == "score":
-        value_display = f"{metric.get('value', 0):.1f}"
+        value_display = f"{value:.1f}"
     elif unit and unit not in value_display:
         value_display = f"{value_display} {unit}"
 
@@ -73,6 +103,7 @@ def metric_card(metric, target=None, higher_is_better=True):
 
     fig = go.Figure()
     fig.add_trace(go.Scatter(
+        x=sprints,
         y=values,
         mode="lines+markers",
         line=dict(width=4, color="#009688", shape="spline"),
@@ -81,8 +112,21 @@ def metric_card(metric, target=None, higher_is_better=True):
         fillcolor="rgba(0,150,136,0.09)",
         showlegend=False,
     ))
+    points = [i for i in (anomaly or {}).get("points", []) if start <= i < start + len(values)]
+    if points:
+        adverse = set(anomaly["adverse_points"])
+        fig.add_trace(go.Scatter(
+            x=[i + 1 for i in points],
+            y=[values[i - start] for i in points],
+            mode="markers",
+            marker=dict(size=13, symbol="circle-open", line=dict(width=3),
+                        color=["#e4572e" if i in adverse else "#aaa" for i in points]),
+            showlegend=False,
+            name="Anomaly",
+        ))
     if target is not None:
         fig.add_trace(go.Scatter(
+            x=sprints,
             y=[target]*len(values),
             mode="lines",
             line=dict(width=2, dash="dash", color="#ffa726"),
@@ -133,7 +177,7 @@ def metric_card(metric, target=None, higher_is_better=True):
                 <span style="font-size:2.1em; color:#222; font-weight:800;">{value_display}</span>
                 <span style="font-size:1.4em; color:{arrow_color}; font-weight:800;">{arrow}</span>
                 <span style="font-size:1.13em; color:{arrow_color};">{delta_str}</span>
-                <span style="font-size:1.02em; color:#888; margin-left:12px;">(vs start)</span>
+                <span style="font-size:1.02em; color:#888; margin-left:12px;">(vs sprint {start + 1})</span>
             </div>
         """,
         unsafe_allow_html=True,
@@ -157,6 +201,12 @@ st.title("🟢 Delivery Health Model Dashboard")
 radio_labels = [label for path, label in all_options]
 radio_map = {label: path for path, label in all_options}
 
+attention = anomalies.needs_attention(anomaly_result, limit=10)
+if attention:
+    with st.sidebar.expander(f"🔴 What needs attention ({len(attention)})", expanded=True):
+        for path, counts in attention:
+            st.markdown(f"**{counts['own_adverse']}** · {path.split('/')[-1]}")
+
 selected_label = st.sidebar.radio(
     "Navigate indicators (parent/child hierarchy is shown visually):", radio_labels, index=0
 )
@@ -171,8 +221,26 @@ if selected_node.get("data_source"):
     st.markdown(f"<b class='metric-source'>Data source:</b> {selected_node['data_source']}")
 
 if selected_node.get("metrics"):
+    node_series = {
+        metric.get("metric_name", "Metric"): metric_histories.get((selected_path, metric.get("metric_name", "Metric")))
+        for metric in selected_node["metrics"]
+    }
+    n_sprints = max((len(s) for s in node_series.values() if s is not None), default=0)
+    window = None
+    if n_sprints > 1:
+        first, last = st.sidebar.slider(
+            "Sprint window", 1, n_sprints, (max(1, n_sprints - DEFAULT_WINDOW + 1), n_sprints)
+        )
+        window = (first - 1, last)
+
     st.markdown("### Metrics")
     for metric in selected_node["metrics"]:
-        metric_card(metric)
+        metric_name = metric.get("metric_name", "Metric")
+        metric_card(
+            metric,
+            anomaly=anomaly_result["metrics"].get((selected_path, metric_name)),
+            series=node_series[metric_name],
+            window=window,
+        )
 
 children_chips(selected_node.get("children", []))
\ No newline at end of file
@@ -0,0 +1,17 @@
+import anomalies
+
+
+def test_single_spike_does_not_flag_the_points_after_it():
+    result = anomalies.detect([[1, 2, 3, 4, 5, 6, 7, 8, 100, 9, 10, 11]], [True])[0]
+    assert result["points"] == [8]
+    assert result["adverse_points"] == []
+
+
+def test_step_sized_wobble_is_not_anomalous():
+    result = anomalies.detect([[3, 3, 4, 3, 3, 4, 3, 3, 4, 3, 3, 4]], [False])[0]
+    assert result["points"] == []
+
+
+def test_malformed_series_are_invalid_not_errors():
+    detections = anomalies.detect([[1, [2, 3], 3, 4, 5], [10**400, 1, 2, 3, 4], [1, 2, 3, 4, 5]], [True] * 3)
+    assert detections.valid.tolist() == [False, False, True]